@@ -1,21 +1,76 @@
 import os
+import asyncio
+import functools
+from io import BytesIO
 from typing import List, Tuple, Optional
 from PIL import Image
 from google import genai
 from google.genai import types
+from google.genai import errors
 from dotenv import load_dotenv
+import aiohttp
+import httpx
+import tenacity
 
 load_dotenv()
 
+# Per-attempt timeout for a Gemini request; 4K image generation can take minutes
+REQUEST_TIMEOUT_MS = 300_000
+
+# Transient failures (rate limiting, overloaded or flaky backend, timeouts) are retried
+# with exponential backoff and jitter, so one bad response doesn't lose a page.
+RETRY_ATTEMPTS = 3
+RETRY_HTTP_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+def _is_transient_error(e: BaseException) -> bool:
+    """Returns True for errors worth retrying: retryable HTTP statuses, timeouts and connection failures."""
+    if isinstance(e, errors.APIError):
+        return e.code in RETRY_HTTP_STATUS_CODES
+    # The SDK sends requests through aiohttp when installed, otherwise httpx
+    return isinstance(e, (asyncio.TimeoutError, aiohttp.ClientError, httpx.TimeoutException, httpx.ConnectError))
+
+@functools.lru_cache(maxsize=1)
 def get_client():
+    """
+    Returns a shared Gemini client. Reusing one client keeps its HTTP connections
+    pooled, so concurrent page requests don't each pay for a new TLS handshake.
+    """
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY not found in environment variables")
-    return genai.Client(api_key=api_key)
+    return genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(timeout=REQUEST_TIMEOUT_MS)
+    )
 
-def generate_edited_slide(
-    target_image: Image.Image,
-    style_reference_images: List[Image.Image],
+async def _generate_content(client, contents: list, config: types.GenerateContentConfig):
+    """Calls the image model, retrying transient failures (see _is_transient_error)."""
+    async for attempt in tenacity.AsyncRetrying(
+        stop=tenacity.stop_after_attempt(RETRY_ATTEMPTS),
+        wait=tenacity.wait_exponential_jitter(initial=1.0, max=30.0, jitter=1.0),
+        retry=tenacity.retry_if_exception(_is_transient_error),
+        reraise=True
+    ):
+        with attempt:
+            response = await client.aio.models.generate_content(
+                model='gemini-3-pro-image-preview',
+                contents=contents,
+                config=config
+            )
+    return response
+
+def encode_image(image: Image.Image) -> types.Part:
+    """
+    Encodes an image as a PNG part once, so it can be reused across requests
+    instead of being re-encoded by the SDK for every call.
+    """
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return types.Part.from_bytes(data=buffer.getvalue(), mime_type="image/png")
+
+async def generate_edited_slide(
+    target_image: Image.Image | types.Part,
+    style_reference_images: List[Image.Image | types.Part],
     full_text_context: str,
     user_prompt: str,
     resolution: str = "4K",
@@ -23,16 +78,16 @@ def generate_edited_slide(
 ) -> Tuple[Image.Image, Optional[str]]:
     """
     Sends the target image, style refs, and text context to Gemini 3 Pro Image.
+    Images may be passed pre-encoded (see encode_image).
     Returns tuple of (generated PIL Image, optional text response).
     """
     client = get_client()
 
     # Construct the prompt
+    # Content shared by every page in a run (style refs, document context) goes first,
+    # so all requests start with the same prefix and can hit Gemini's implicit cache
     prompt_parts = []
 
-    prompt_parts.append(user_prompt)
-    prompt_parts.append(target_image)
-
     if style_reference_images:
         prompt_parts.append("Match the visual style (fonts, colors, layout) of these reference images:")
         for img in style_reference_images:
@@ -41,6 +96,9 @@ def generate_edited_slide(
     if full_text_context:
         prompt_parts.append(f"DOCUMENT CONTEXT:\n{full_text_context}\n")
 
+    prompt_parts.append(user_prompt)
+    prompt_parts.append(target_image)
+
     # Build config - allow both text and image output
     config = types.GenerateContentConfig(
         response_modalities=['TEXT', 'IMAGE'],
@@ -53,11 +111,7 @@ def generate_edited_slide(
 
     # Call the model
     try:
-        response = client.models.generate_content(
-            model='gemini-3-pro-image-preview',
-            contents=prompt_parts,
-            config=config
-        )
+        response = await _generate_content(client, prompt_parts, config)
     except Exception as e:
         error_msg = str(e).lower()
         if "quota" in error_msg or "billing" in error_msg or "payment" in error_msg:
@@ -75,7 +129,7 @@ def generate_edited_slide(
                 f"Original error: {e}"
             )
         else:
-            raise RuntimeError(f"Gemini API Error: {e}")
+            raise RuntimeError(f"Gemini API Error: {type(e).__name__}: {e}")
 
     # Extract image and text from the response
     generated_image = None
@@ -84,7 +138,6 @@ def generate_edited_slide(
         for part in response.candidates[0].content.parts:
             if part.inline_data:
                 # Convert bytes to PIL Image
-                from io import BytesIO
                 generated_image = Image.open(BytesIO(part.inline_data.data))
             elif part.text:
                 response_text = part.text
@@ -94,8 +147,8 @@ def generate_edited_slide(
 
     return generated_image, response_text
 
-def generate_new_slide(
-    style_reference_images: List[Image.Image],
+async def generate_new_slide(
+    style_reference_images: List[Image.Image | types.Part],
     user_prompt: str,
     full_text_context: str = "",
     resolution: str = "4K",
@@ -108,10 +161,9 @@ def generate_new_slide(
     client = get_client()
 
     # Construct the prompt
+    # Shared content first, as in generate_edited_slide, to keep a common cacheable prefix
     prompt_parts = []
 
-    prompt_parts.append(user_prompt)
-
     if style_reference_images:
         prompt_parts.append("Match the visual style (fonts, colors, layout) of these reference images:")
         for img in style_reference_images:
@@ -120,6 +172,8 @@ def generate_new_slide(
     if full_text_context:
         prompt_parts.append(f"DOCUMENT CONTEXT:\n{full_text_context}\n")
 
+    prompt_parts.append(user_prompt)
+
     # Build config - allow both text and image output
     config = types.GenerateContentConfig(
         response_modalities=['TEXT', 'IMAGE'],
@@ -132,11 +186,7 @@ def generate_new_slide(
 
     # Call the model
     try:
-        response = client.models.generate_content(
-            model='gemini-3-pro-image-preview',
-            contents=prompt_parts,
-            config=config
-        )
+        response = await _generate_content(client, prompt_parts, config)
     except Exception as e:
         error_msg = str(e).lower()
         if "quota" in error_msg or "billing" in error_msg or "payment" in error_msg:
@@ -154,7 +204,7 @@ def generate_new_slide(
                 f"Original error: {e}"
             )
         else:
-            raise RuntimeError(f"Gemini API Error: {e}")
+            raise RuntimeError(f"Gemini API Error: {type(e).__name__}: {e}")
 
     # Extract image and text from the response
     generated_image = None
@@ -163,7 +213,6 @@ def generate_new_slide(
         for part in response.candidates[0].content.parts:
             if part.inline_data:
                 # Convert bytes to PIL Image
-                from io import BytesIO
                 generated_image = Image.open(BytesIO(part.inline_data.data))
             elif part.text:
                 response_text = part.text
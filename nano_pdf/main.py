@@ -1,12 +1,73 @@
 import typer
 from typing import List, Optional
 from pathlib import Path
+from rich.progress import Progress
 from nano_pdf import pdf_utils, ai_utils
+import asyncio
 import concurrent.futures
-import tempfile
+import io
+import os
 
 app = typer.Typer()
 
+# Rendering and OCR shell out to pdftoppm/tesseract, so run about one per core
+# while Gemini requests for other pages stay in flight.
+CPU_STAGE_WORKERS = os.cpu_count() or 4
+_cpu_stage_pool = concurrent.futures.ThreadPoolExecutor(max_workers=CPU_STAGE_WORKERS)
+
+def _limit_ocr_threads(job_count: int, concurrency: int):
+    """Keeps each tesseract run single-threaded when the pool will run several OCR jobs at once."""
+    parallel_ocr_jobs = min(job_count, concurrency, CPU_STAGE_WORKERS)
+    if parallel_ocr_jobs > 1:
+        # Tesseract's own OpenMP threading oversubscribes the cores when several instances
+        # run side by side; leave the parallelism to the pool instead. A single OCR job
+        # keeps tesseract's threads, and a user-provided limit is respected.
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+async def _run_cpu_stage(func, *args):
+    """Runs a render/rehydrate step on the CPU stage pool without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_cpu_stage_pool, func, *args)
+
+async def _render_style_ref(pdf_path: str, page_num: int):
+    """Renders and encodes a style reference page, returning None (with a warning) on failure."""
+    try:
+        image = await _run_cpu_stage(pdf_utils.render_page_as_image, pdf_path, page_num)
+        return await _run_cpu_stage(ai_utils.encode_image, image)
+    except Exception as e:
+        typer.echo(f"Warning: Could not render Page {page_num}: {e}")
+        return None
+
+async def _gather_style_refs(style_tasks: dict) -> list:
+    """Waits for the style reference renders, keeping those that succeeded in order."""
+    return [part for part in await asyncio.gather(*style_tasks.values()) if part is not None]
+
+def _rate_limiter(rate: float):
+    """Returns a coroutine function that waits until the next of `rate` slots per second is free."""
+    lock = asyncio.Lock()
+    next_start = 0.0
+
+    async def wait_turn():
+        nonlocal next_start
+        async with lock:
+            now = asyncio.get_running_loop().time()
+            delay = next_start - now
+            next_start = max(now, next_start) + 1 / rate
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    return wait_turn
+
+async def _as_completed_bounded(coros, limit: int):
+    """Runs coroutines with at most `limit` in flight, yielding results as they complete."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(coro):
+        async with semaphore:
+            return await coro
+
+    for future in asyncio.as_completed([bounded(c) for c in coros]):
+        yield await future
+
 @app.command()
 def edit(
     pdf_path: str = typer.Argument(..., help="Path to the PDF file"),
@@ -15,7 +76,10 @@ def edit(
     use_context: bool = typer.Option(False, help="Include full PDF text as context (can confuse the model)"),
     output: Optional[str] = typer.Option(None, help="Output path for the edited PDF. Defaults to 'edited_<filename>'"),
     resolution: str = typer.Option("4K", help="Image resolution: '4K', '2K', '1K' (higher = better quality but slower)"),
-    disable_google_search: bool = typer.Option(False, help="Disable Google Search (enabled by default)")
+    disable_google_search: bool = typer.Option(False, help="Disable Google Search (enabled by default)"),
+    concurrency: int = typer.Option(50, min=1, envvar="NANO_PDF_CONCURRENCY", help="Maximum number of Gemini requests in flight at once"),
+    rate_limit: float = typer.Option(5.0, min=0.1, help="Maximum number of Gemini requests started per second"),
+    verbose: bool = typer.Option(False, help="Print per-page status and the model's text responses")
 ):
     """
     Edit a PDF page using Nano Banana (Gemini 3 Pro Image).
@@ -33,6 +97,8 @@ def edit(
         typer.echo(f"Error: File {pdf_path} not found.")
         raise typer.Exit(code=1)
 
+    total_pages = pdf_utils.get_page_count(str(input_path))
+
     if not output:
         output = f"edited_{input_path.name}"
     
@@ -41,29 +107,26 @@ def edit(
         typer.echo("Error: Edits must be pairs of 'PageNumber Prompt'.")
         raise typer.Exit(code=1)
 
-    # Merge duplicate page edits into a single prompt
+    # Validate page numbers and merge duplicate page edits into a single prompt
     edits_by_page = {}
     for i in range(0, len(edits), 2):
         try:
             p_num = int(edits[i])
-            prompt = edits[i+1]
-            if p_num in edits_by_page:
-                # Merge prompts with separator
-                edits_by_page[p_num] += f"\n\nALSO: {prompt}"
-            else:
-                edits_by_page[p_num] = prompt
         except ValueError:
             typer.echo(f"Error: Invalid page number '{edits[i]}'")
             raise typer.Exit(code=1)
+        if p_num < 1 or p_num > total_pages:
+            typer.echo(f"Error: Invalid page number {p_num}. PDF has {total_pages} pages.")
+            raise typer.Exit(code=1)
 
-    parsed_edits = list(edits_by_page.items())
+        prompt = edits[i+1]
+        if p_num in edits_by_page:
+            # Merge prompts with separator
+            edits_by_page[p_num] += f"\n\nALSO: {prompt}"
+        else:
+            edits_by_page[p_num] = prompt
 
-    # Validate page numbers are within range
-    total_pages = pdf_utils.get_page_count(str(input_path))
-    invalid_pages = [p for p, _ in parsed_edits if p < 1 or p > total_pages]
-    if invalid_pages:
-        typer.echo(f"Error: Invalid page number(s) {invalid_pages}. PDF has {total_pages} pages.")
-        raise typer.Exit(code=1)
+    parsed_edits = list(edits_by_page.items())
 
     typer.echo(f"Processing {pdf_path} with {len(parsed_edits)} edits...")
     
@@ -71,38 +134,50 @@ def edit(
     full_text = ""
     if use_context:
         typer.echo("Extracting text context...")
-        full_text = pdf_utils.extract_full_text(str(input_path))
+        full_text = pdf_utils.extract_full_text_cached(str(input_path))
         if not full_text:
             typer.echo("Warning: Could not extract text from PDF. Context will be limited.")
     else:
         typer.echo("Skipping text context (use --use-context to enable)...")
     
     # 2. Prepare Visual Context (Style Anchors)
-    typer.echo("Rendering reference images...")
-    style_images = []
+    style_pages = [] # rendered alongside the edit pages, once each even if also an edit target
     
     # Add user-defined style refs
     if style_refs:
         for ref_page in style_refs.split(','):
             try:
                 p_num = int(ref_page.strip())
-                style_images.append(pdf_utils.render_page_as_image(str(input_path), p_num))
             except ValueError:
                 typer.echo(f"Warning: Invalid style ref '{ref_page}'")
-            except Exception as e:
-                typer.echo(f"Warning: Could not render Page {ref_page}: {e}")
+                continue
+            if p_num < 1 or p_num > total_pages:
+                typer.echo(f"Warning: Style ref page {p_num} out of range, skipping")
+                continue
+            if p_num not in style_pages:
+                style_pages.append(p_num)
 
     # 3. Process Each Edit (Parallel)
-    replacements = {} # page_num -> temp_pdf_path
-    temp_files = []
+    replacements = {} # page_num -> in-memory single-page PDF
+    style_tasks = {} # page_num -> task resolving to the encoded image (or None)
+    wait_for_rate_limit = _rate_limiter(rate_limit)
 
-    def process_single_page(page_num: int, prompt_text: str):
-        typer.echo(f"Starting Page {page_num}...")
+    async def process_single_page(page_num: int, prompt_text: str):
+        if verbose:
+            typer.echo(f"Starting Page {page_num}...")
         try:
-            target_image = pdf_utils.render_page_as_image(str(input_path), page_num)
+            target_image = None
+            if page_num in style_tasks:
+                target_image = await style_tasks[page_num]
+            if target_image is None:
+                target_image = await _run_cpu_stage(pdf_utils.render_page_as_image, str(input_path), page_num)
+
+            # Style refs were queued first, so this only waits for the slowest of them
+            style_images = await _gather_style_refs(style_tasks)
             
-            # Generate
-            generated_image, response_text = ai_utils.generate_edited_slide(
+            # Generate (throttled to the rate limit; other pages keep rendering meanwhile)
+            await wait_for_rate_limit()
+            generated_image, response_text = await ai_utils.generate_edited_slide(
                 target_image=target_image,
                 style_reference_images=style_images,
                 full_text_context=full_text,
@@ -112,35 +187,37 @@ def edit(
             )
 
             # Print model's text response if any
-            if response_text:
+            if verbose and response_text:
                 typer.echo(f"Model response for page {page_num}: {response_text}")
 
             # Re-hydrate
-            temp_pdf_file = tempfile.NamedTemporaryFile(mode='wb', suffix='.pdf', delete=False)
-            temp_pdf = temp_pdf_file.name
-            temp_pdf_file.close()
-            pdf_utils.rehydrate_image_to_pdf(generated_image, temp_pdf)
+            page_pdf = io.BytesIO()
+            await _run_cpu_stage(pdf_utils.rehydrate_image_to_pdf, generated_image, page_pdf)
+            page_pdf.seek(0)
             
-            typer.echo(f"Finished Page {page_num}")
-            return (page_num, temp_pdf)
+            if verbose:
+                typer.echo(f"Finished Page {page_num}")
+            return (page_num, page_pdf)
         except Exception as e:
             typer.echo(f"Error processing Page {page_num}: {e}")
             return None
 
     typer.echo(f"Processing {len(parsed_edits)} pages in parallel...")
 
-    completed_count = 0
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        futures = [executor.submit(process_single_page, p, prompt) for p, prompt in parsed_edits]
-
-        for future in concurrent.futures.as_completed(futures):
-            result = future.result()
-            if result:
-                p_num, temp_pdf = result
-                replacements[p_num] = temp_pdf
-                temp_files.append(temp_pdf)
-            completed_count += 1
-            typer.echo(f"Progress: {completed_count}/{len(parsed_edits)} pages completed")
+    async def process_all_pages():
+        for p_num in style_pages:
+            style_tasks[p_num] = asyncio.create_task(_render_style_ref(str(input_path), p_num))
+        jobs = [process_single_page(p, prompt) for p, prompt in parsed_edits]
+        with Progress() as progress:
+            task = progress.add_task("Editing pages", total=len(parsed_edits))
+            async for result in _as_completed_bounded(jobs, concurrency):
+                if result:
+                    p_num, page_pdf = result
+                    replacements[p_num] = page_pdf
+                progress.update(task, advance=1)
+
+    _limit_ocr_threads(len(parsed_edits), concurrency)
+    asyncio.run(process_all_pages())
 
     if not replacements:
         typer.echo("No pages were successfully processed.")
@@ -153,23 +230,21 @@ def edit(
     except Exception as e:
         typer.echo(f"Error stitching PDF: {e}")
         raise typer.Exit(code=1)
-    finally:
-        # Cleanup
-        for f in temp_files:
-            if Path(f).exists():
-                Path(f).unlink()
 
     typer.echo(f"Done! Saved to {output}")
 
 @app.command()
 def add(
     pdf_path: str = typer.Argument(..., help="Path to the PDF file"),
-    adds: List[str] = typer.Argument(..., help="Pairs of 'AfterPage Prompt' (e.g. 0 'Title slide' 2 'Summary slide')"),
+    adds: List[str] = typer.Argument(..., help="Pairs of 'AfterPage Prompt' (e.g. 0 'Title slide' 2 'Summary slide'). Slides sharing an AfterPage are kept in the order given and push later slides back"),
     style_refs: Optional[str] = typer.Option(None, help="Comma-separated list of reference page numbers for style (e.g. '1,2'). Defaults to first page."),
     use_context: bool = typer.Option(True, help="Include full PDF text as context (enabled by default for better slide generation)"),
     output: Optional[str] = typer.Option(None, help="Output path for the PDF. Defaults to 'edited_<filename>'"),
     resolution: str = typer.Option("4K", help="Image resolution: '4K', '2K', '1K' (higher = better quality but slower)"),
-    disable_google_search: bool = typer.Option(False, help="Disable Google Search (enabled by default)")
+    disable_google_search: bool = typer.Option(False, help="Disable Google Search (enabled by default)"),
+    concurrency: int = typer.Option(50, min=1, envvar="NANO_PDF_CONCURRENCY", help="Maximum number of Gemini requests in flight at once"),
+    rate_limit: float = typer.Option(5.0, min=0.1, help="Maximum number of Gemini requests started per second"),
+    verbose: bool = typer.Option(False, help="Print per-page status and the model's text responses")
 ):
     """
     Add new slide(s) to a PDF using AI generation.
@@ -187,6 +262,8 @@ def add(
         typer.echo(f"Error: File {pdf_path} not found.")
         raise typer.Exit(code=1)
 
+    total_pages = pdf_utils.get_page_count(str(input_path))
+
     if not output:
         output = f"edited_{input_path.name}"
 
@@ -199,21 +276,22 @@ def add(
     for i in range(0, len(adds), 2):
         try:
             after_page = int(adds[i])
-            prompt = adds[i+1]
-            parsed_adds.append((after_page, prompt))
         except ValueError:
             typer.echo(f"Error: Invalid page number '{adds[i]}'")
             raise typer.Exit(code=1)
+        if after_page < 0:
+            typer.echo(f"Error: Invalid after_page value {after_page}. Must be 0 or greater.")
+            raise typer.Exit(code=1)
+        parsed_adds.append((after_page, adds[i+1]))
 
-    # Validate after_page values
+    # Validate upper bounds
     # Sort by after_page to validate sequentially (pages added earlier increase the valid range for later ones)
-    total_pages = pdf_utils.get_page_count(str(input_path))
     sorted_adds = sorted(parsed_adds, key=lambda x: x[0])
 
     for idx, (after_page, _) in enumerate(sorted_adds):
         # Each previously added page increases the max valid position by 1
         max_valid_position = total_pages + idx
-        if after_page < 0 or after_page > max_valid_position:
+        if after_page > max_valid_position:
             typer.echo(f"Error: Invalid after_page value {after_page}. Must be between 0 and {max_valid_position} (considering {idx} page(s) added before it).")
             raise typer.Exit(code=1)
 
@@ -226,43 +304,43 @@ def add(
     full_text = ""
     if use_context:
         typer.echo("Extracting text context...")
-        full_text = pdf_utils.extract_full_text(str(input_path))
+        full_text = pdf_utils.extract_full_text_cached(str(input_path))
         if not full_text:
             typer.echo("Warning: Could not extract text from PDF. Context will be limited.")
 
-    # Prepare style references
-    typer.echo("Rendering style reference images...")
-    style_images = []
+    # Prepare style references (rendered in parallel once generation starts)
+    style_pages = []
 
     if style_refs:
         for ref_page in style_refs.split(','):
             try:
                 p_num = int(ref_page.strip())
-                if p_num < 1 or p_num > total_pages:
-                    typer.echo(f"Warning: Style ref page {p_num} out of range, skipping")
-                    continue
-                style_images.append(pdf_utils.render_page_as_image(str(input_path), p_num))
             except ValueError:
                 typer.echo(f"Warning: Invalid style ref '{ref_page}'")
-            except Exception as e:
-                typer.echo(f"Warning: Could not render Page {ref_page}: {e}")
+                continue
+            if p_num < 1 or p_num > total_pages:
+                typer.echo(f"Warning: Style ref page {p_num} out of range, skipping")
+                continue
+            if p_num not in style_pages:
+                style_pages.append(p_num)
     else:
         # Default to first page as style reference
         typer.echo("Using page 1 as default style reference...")
-        try:
-            style_images.append(pdf_utils.render_page_as_image(str(input_path), 1))
-        except Exception as e:
-            typer.echo(f"Warning: Could not render Page 1: {e}")
+        style_pages.append(1)
 
     # Generate new slides (Parallel)
     typer.echo(f"Generating {len(parsed_adds)} slide(s) with AI in parallel...")
-    generated_slides = {}  # after_page -> temp_pdf_path
-    temp_files = []
+    generated_slides = {}  # index in parsed_adds -> (after_page, in-memory single-page PDF)
+    style_tasks = {}  # page_num -> task resolving to the encoded image (or None)
+    wait_for_rate_limit = _rate_limiter(rate_limit)
 
-    def process_single_slide(after_page: int, prompt_text: str):
-        typer.echo(f"Starting slide for insertion after page {after_page}...")
+    async def process_single_slide(index: int, after_page: int, prompt_text: str):
+        if verbose:
+            typer.echo(f"Starting slide for insertion after page {after_page}...")
         try:
-            generated_image, response_text = ai_utils.generate_new_slide(
+            style_images = await _gather_style_refs(style_tasks)
+            await wait_for_rate_limit()
+            generated_image, response_text = await ai_utils.generate_new_slide(
                 style_reference_images=style_images,
                 user_prompt=prompt_text,
                 full_text_context=full_text,
@@ -271,33 +349,35 @@ def add(
             )
 
             # Print model's text response if any
-            if response_text:
+            if verbose and response_text:
                 typer.echo(f"Model response for slide after page {after_page}: {response_text}")
 
             # Re-hydrate to PDF
-            temp_pdf_file = tempfile.NamedTemporaryFile(mode='wb', suffix='.pdf', delete=False)
-            temp_pdf = temp_pdf_file.name
-            temp_pdf_file.close()
-            pdf_utils.rehydrate_image_to_pdf(generated_image, temp_pdf)
+            slide_pdf = io.BytesIO()
+            await _run_cpu_stage(pdf_utils.rehydrate_image_to_pdf, generated_image, slide_pdf)
+            slide_pdf.seek(0)
 
-            typer.echo(f"Finished slide for insertion after page {after_page}")
-            return (after_page, temp_pdf)
+            if verbose:
+                typer.echo(f"Finished slide for insertion after page {after_page}")
+            return (index, after_page, slide_pdf)
         except Exception as e:
             typer.echo(f"Error generating slide for insertion after page {after_page}: {e}")
             return None
 
-    completed_count = 0
-    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-        futures = [executor.submit(process_single_slide, after_page, prompt) for after_page, prompt in parsed_adds]
-
-        for future in concurrent.futures.as_completed(futures):
-            result = future.result()
-            if result:
-                after_page, temp_pdf = result
-                generated_slides[after_page] = temp_pdf
-                temp_files.append(temp_pdf)
-            completed_count += 1
-            typer.echo(f"Progress: {completed_count}/{len(parsed_adds)} slides completed")
+    async def process_all_slides():
+        for p_num in style_pages:
+            style_tasks[p_num] = asyncio.create_task(_render_style_ref(str(input_path), p_num))
+        jobs = [process_single_slide(i, after_page, prompt) for i, (after_page, prompt) in enumerate(parsed_adds)]
+        with Progress() as progress:
+            task = progress.add_task("Generating slides", total=len(parsed_adds))
+            async for result in _as_completed_bounded(jobs, concurrency):
+                if result:
+                    index, after_page, slide_pdf = result
+                    generated_slides[index] = (after_page, slide_pdf)
+                progress.update(task, advance=1)
+
+    _limit_ocr_threads(len(parsed_adds), concurrency)
+    asyncio.run(process_all_slides())
 
     if not generated_slides:
         typer.echo("No slides were successfully generated.")
@@ -306,32 +386,12 @@ def add(
     # Insert all slides into the PDF
     typer.echo(f"\nInserting {len(generated_slides)} slide(s) into PDF...")
     try:
-        # Sort by after_page in ASCENDING order for sequential additions
-        # Each insertion increases the page count, allowing the next sequential position to exist
-        sorted_adds = sorted(generated_slides.items(), key=lambda x: x[0], reverse=False)
-
-        current_pdf = str(input_path)
-        for i, (after_page, temp_pdf) in enumerate(sorted_adds):
-            if i == len(sorted_adds) - 1:
-                # Last insertion, write to final output
-                pdf_utils.insert_page(current_pdf, temp_pdf, after_page, output)
-            else:
-                # Intermediate insertion, write to temp file
-                temp_intermediate = tempfile.NamedTemporaryFile(mode='wb', suffix='.pdf', delete=False)
-                intermediate_path = temp_intermediate.name
-                temp_intermediate.close()
-                temp_files.append(intermediate_path)
-
-                pdf_utils.insert_page(current_pdf, temp_pdf, after_page, intermediate_path)
-                current_pdf = intermediate_path
+        # Keep the ascending after_page order; slides sharing a position stay in the order given
+        sorted_adds = [generated_slides[i] for i in sorted(generated_slides)]
+        pdf_utils.batch_insert_pages(str(input_path), sorted_adds, output)
     except Exception as e:
         typer.echo(f"Error inserting slides: {e}")
         raise typer.Exit(code=1)
-    finally:
-        # Cleanup
-        for f in temp_files:
-            if Path(f).exists():
-                Path(f).unlink()
 
     typer.echo(f"Done! Added {len(generated_slides)} new slide(s). Saved to {output}")
 
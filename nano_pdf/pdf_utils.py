@@ -1,10 +1,14 @@
 import os
 import subprocess
 import shutil
+import hashlib
+import tempfile
+from pathlib import Path
 from pdf2image import convert_from_path
 from pypdf import PdfReader, PdfWriter
 import pytesseract
 from PIL import Image
+from typing import IO
 
 def check_system_dependencies():
     """Checks if required system dependencies are installed."""
@@ -74,6 +78,73 @@ def extract_full_text(pdf_path: str) -> str:
         print(f"Error extracting text: {e}")
         return ""
 
+# Bump when extract_full_text's output format changes, so stale cache entries are ignored
+TEXT_CACHE_VERSION = 1
+
+# Least recently used cached texts are pruned beyond this many entries
+TEXT_CACHE_MAX_ENTRIES = 50
+
+def _cache_dir() -> Path:
+    """Returns the per-user cache directory for nano-pdf."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "nano-pdf"
+
+def _prune_text_cache(cache_dir: Path):
+    """Removes the least recently used cached texts beyond TEXT_CACHE_MAX_ENTRIES."""
+    entries = sorted(cache_dir.glob("text-*.txt"), key=lambda f: f.stat().st_mtime, reverse=True)
+    for old_entry in entries[TEXT_CACHE_MAX_ENTRIES:]:
+        old_entry.unlink(missing_ok=True)
+
+def extract_full_text_cached(pdf_path: str) -> str:
+    """
+    Like extract_full_text, but caches the result on disk keyed by the file's path,
+    modification time and size, so re-runs against an unchanged PDF skip extraction.
+    The cache keeps the TEXT_CACHE_MAX_ENTRIES most recently used documents, readable only by
+    the user. Set NANO_PDF_NO_CACHE to disable it.
+    """
+    if os.environ.get("NANO_PDF_NO_CACHE"):
+        return extract_full_text(pdf_path)
+
+    path = Path(pdf_path).resolve()
+    stat = path.stat()
+    key_source = f"v{TEXT_CACHE_VERSION}:{path}:{stat.st_mtime_ns}:{stat.st_size}"
+    key = hashlib.sha1(key_source.encode()).hexdigest()
+    cache_dir = _cache_dir()
+    cache_file = cache_dir / f"text-{key}.txt"
+
+    try:
+        text = cache_file.read_text(encoding='utf-8')
+        # A complete entry always ends with the closing tag; anything else is damaged
+        if text.endswith("</document_context>"):
+            # Mark as recently used so pruning evicts decks that haven't been touched
+            try:
+                os.utime(cache_file)
+            except OSError:
+                pass
+            return text
+    except (OSError, ValueError):  # UnicodeDecodeError is a ValueError
+        pass
+
+    text = extract_full_text(pdf_path)
+    if text:
+        # Caching is best-effort; a read-only home directory shouldn't fail the run
+        try:
+            cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+            # Write to a private temp file and rename it into place, so an interrupted
+            # or concurrent run never leaves a partial entry behind
+            fd, temp_path = tempfile.mkstemp(dir=cache_dir, prefix="text-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(temp_path, cache_file)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            _prune_text_cache(cache_dir)
+        except OSError:
+            pass
+    return text
+
 def render_page_as_image(pdf_path: str, page_number: int) -> Image.Image:
     """Renders a specific page (1-indexed) as a PIL Image."""
     images = convert_from_path(
@@ -85,14 +156,18 @@ def render_page_as_image(pdf_path: str, page_number: int) -> Image.Image:
         raise ValueError(f"Could not render page {page_number}")
     return images[0]
 
-def rehydrate_image_to_pdf(image: Image.Image, output_pdf_path: str):
+def rehydrate_image_to_pdf(image: Image.Image, output_pdf: str | IO[bytes]):
     """
     Converts an image to a single-page PDF with a hidden text layer using Tesseract.
     This is the 'State Preservation' step.
+    output_pdf: path to write to, or a binary file-like object (e.g. io.BytesIO)
     """
     pdf_bytes = pytesseract.image_to_pdf_or_hocr(image, extension='pdf')
-    with open(output_pdf_path, 'wb') as f:
-        f.write(pdf_bytes)
+    if isinstance(output_pdf, (str, os.PathLike)):
+        with open(output_pdf, 'wb') as f:
+            f.write(pdf_bytes)
+    else:
+        output_pdf.write(pdf_bytes)
 
 def replace_page_in_pdf(original_pdf_path: str, new_page_pdf_path: str, page_number: int, output_pdf_path: str):
     """
@@ -123,10 +198,10 @@ def replace_page_in_pdf(original_pdf_path: str, new_page_pdf_path: str, page_num
     with open(output_pdf_path, 'wb') as f:
         writer.write(f)
 
-def batch_replace_pages(original_pdf_path: str, replacements: dict[int, str], output_pdf_path: str):
+def batch_replace_pages(original_pdf_path: str, replacements: dict[int, str | IO[bytes]], output_pdf_path: str):
     """
     Replaces multiple pages in the original PDF.
-    replacements: dict mapping page_number (1-indexed) -> path_to_new_single_page_pdf
+    replacements: dict mapping page_number (1-indexed) -> new single-page PDF (path or binary file-like)
     """
     reader = PdfReader(original_pdf_path)
     writer = PdfWriter()
@@ -139,8 +214,7 @@ def batch_replace_pages(original_pdf_path: str, replacements: dict[int, str], ou
             original_width = original_page.mediabox.width
             original_height = original_page.mediabox.height
 
-            new_pdf_path = replacements[page_num]
-            new_reader = PdfReader(new_pdf_path)
+            new_reader = PdfReader(replacements[page_num])
             new_page = new_reader.pages[0]
 
             # Resize new page to match original dimensions
@@ -154,9 +228,10 @@ def batch_replace_pages(original_pdf_path: str, replacements: dict[int, str], ou
     with open(output_pdf_path, 'wb') as f:
         writer.write(f)
 
-def insert_page(original_pdf_path: str, new_page_pdf_path: str, after_page: int, output_pdf_path: str):
+def insert_page(original_pdf_path: str, new_page_pdf: str | IO[bytes], after_page: int, output_pdf_path: str):
     """
     Inserts a new page into the PDF after the specified page number.
+    new_page_pdf: single-page PDF to insert (path or binary file-like)
     after_page: 0 to insert at the beginning, or page number (1-indexed) to insert after.
     """
     reader = PdfReader(original_pdf_path)
@@ -168,7 +243,7 @@ def insert_page(original_pdf_path: str, new_page_pdf_path: str, after_page: int,
     ref_height = reference_page.mediabox.height
 
     # Load the new page
-    new_reader = PdfReader(new_page_pdf_path)
+    new_reader = PdfReader(new_page_pdf)
     new_page = new_reader.pages[0]
     new_page.scale_to(width=float(ref_width), height=float(ref_height))
 
@@ -185,3 +260,49 @@ def insert_page(original_pdf_path: str, new_page_pdf_path: str, after_page: int,
 
     with open(output_pdf_path, 'wb') as f:
         writer.write(f)
+
+def batch_insert_pages(original_pdf_path: str, insertions: list[tuple[int, str | IO[bytes]]], output_pdf_path: str):
+    """
+    Inserts multiple new pages into the PDF in a single pass.
+    insertions: (after_page, new single-page PDF as path or binary file-like) pairs, sorted by after_page.
+    When all after_page values are distinct, this matches repeated insert_page calls in ascending
+    order: each is the position in the document after all earlier insertions (0 = beginning).
+    Pages sharing an after_page are placed one after another, in the order given, and every later
+    insertion is pushed back past them; e.g. [(1, A), (1, B), (2, C)] yields p1, A, B, C, p2, ...
+    """
+    reader = PdfReader(original_pdf_path)
+    writer = PdfWriter()
+
+    # Get dimensions from the first page as reference
+    reference_page = reader.pages[0]
+    ref_width = reference_page.mediabox.width
+    ref_height = reference_page.mediabox.height
+
+    # Rebase to final 0-indexed positions, bumping ties past the previous insertion
+    positions = {}
+    position = -1
+    for after_page, new_page_pdf in insertions:
+        position = max(after_page, position + 1)
+        positions[position] = new_page_pdf
+
+    def add_new_page(position: int):
+        new_reader = PdfReader(positions[position])
+        new_page = new_reader.pages[0]
+        new_page.scale_to(width=float(ref_width), height=float(ref_height))
+        writer.add_page(new_page)
+
+    position = 0
+    for page in reader.pages:
+        # Insert any new pages that land before this original page
+        while position in positions:
+            add_new_page(position)
+            position += 1
+        writer.add_page(page)
+        position += 1
+
+    # Insertions at or past the end of the document are appended in order
+    for p in sorted(p for p in positions if p >= position):
+        add_new_page(p)
+
+    with open(output_pdf_path, 'wb') as f:
+        writer.write(f)
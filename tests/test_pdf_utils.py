@@ -0,0 +1,121 @@
+import io
+import os
+import random
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import NameObject, TextStringObject
+
+from nano_pdf import pdf_utils
+
+
+def _tagged_pdf(tags: list[str]) -> io.BytesIO:
+    """Builds a PDF with one blank page per tag, each page carrying its tag for identification."""
+    writer = PdfWriter()
+    for tag in tags:
+        page = writer.add_blank_page(width=100, height=100)
+        page[NameObject("/Tag")] = TextStringObject(tag)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def _tags(pdf_path) -> list[str]:
+    return [str(page["/Tag"]) for page in PdfReader(pdf_path).pages]
+
+
+def test_batch_insert_pages_matches_chained_insert_page(tmp_path):
+    source_pages = ["p1", "p2", "p3", "p4"]
+    source = tmp_path / "source.pdf"
+    source.write_bytes(_tagged_pdf(source_pages).getvalue())
+
+    rng = random.Random(0)
+    for trial in range(200):
+        # Distinct after_page values, valid for sequential insertion
+        count = rng.randint(1, 4)
+        positions = sorted({rng.randint(0, len(source_pages) + i) for i in range(count)})
+        positions = [p for i, p in enumerate(positions) if p <= len(source_pages) + i]
+
+        current = source
+        for i, after_page in enumerate(positions):
+            chained = tmp_path / f"chained_{trial}_{i}.pdf"
+            pdf_utils.insert_page(str(current), _tagged_pdf([f"new{after_page}"]), after_page, str(chained))
+            current = chained
+
+        batched = tmp_path / f"batched_{trial}.pdf"
+        insertions = [(p, _tagged_pdf([f"new{p}"])) for p in positions]
+        pdf_utils.batch_insert_pages(str(source), insertions, str(batched))
+
+        assert _tags(batched) == _tags(current), positions
+
+
+def test_batch_insert_pages_stacks_shared_positions(tmp_path):
+    source = tmp_path / "source.pdf"
+    source.write_bytes(_tagged_pdf(["p1", "p2", "p3"]).getvalue())
+    output = tmp_path / "out.pdf"
+
+    insertions = [(1, _tagged_pdf(["A"])), (1, _tagged_pdf(["B"])), (2, _tagged_pdf(["C"]))]
+    pdf_utils.batch_insert_pages(str(source), insertions, str(output))
+
+    assert _tags(output) == ["p1", "A", "B", "C", "p2", "p3"]
+
+
+def test_batch_insert_pages_appends_past_end(tmp_path):
+    source = tmp_path / "source.pdf"
+    source.write_bytes(_tagged_pdf(["p1", "p2"]).getvalue())
+    output = tmp_path / "out.pdf"
+
+    # Position 3 was only valid counting an earlier slide that failed to generate
+    pdf_utils.batch_insert_pages(str(source), [(3, _tagged_pdf(["A"]))], str(output))
+
+    assert _tags(output) == ["p1", "p2", "A"]
+
+
+def test_extract_full_text_cached_reuses_and_refreshes_entries(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.delenv("NANO_PDF_NO_CACHE", raising=False)
+    calls = []
+    text = "<document_context>\ncontent\n</document_context>"
+    monkeypatch.setattr(pdf_utils, "extract_full_text", lambda path: calls.append(path) or text)
+    pdf = tmp_path / "deck.pdf"
+    pdf.write_bytes(b"deck")
+
+    assert pdf_utils.extract_full_text_cached(str(pdf)) == text
+    (cache_file,) = (tmp_path / "cache" / "nano-pdf").glob("text-*.txt")
+    os.utime(cache_file, (1, 1))
+
+    assert pdf_utils.extract_full_text_cached(str(pdf)) == text
+    assert len(calls) == 1
+    assert cache_file.stat().st_mtime > 1
+
+
+def test_extract_full_text_cached_reextracts_damaged_entries(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.delenv("NANO_PDF_NO_CACHE", raising=False)
+    calls = []
+    text = "<document_context>\nhé\n</document_context>"
+    monkeypatch.setattr(pdf_utils, "extract_full_text", lambda path: calls.append(path) or text)
+    pdf = tmp_path / "deck.pdf"
+    pdf.write_bytes(b"deck")
+
+    pdf_utils.extract_full_text_cached(str(pdf))
+    (cache_file,) = (tmp_path / "cache" / "nano-pdf").glob("text-*.txt")
+
+    # Cut in the middle of the multi-byte character, then leave a decodable partial entry
+    cache_file.write_bytes(text.encode("utf-8")[:21])
+    assert pdf_utils.extract_full_text_cached(str(pdf)) == text
+    cache_file.write_text("<document_context>\npart", encoding="utf-8")
+    assert pdf_utils.extract_full_text_cached(str(pdf)) == text
+    assert len(calls) == 3
+
+
+def test_extract_full_text_cached_can_be_disabled(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("NANO_PDF_NO_CACHE", "1")
+    monkeypatch.setattr(pdf_utils, "extract_full_text", lambda path: "<document_context>\n</document_context>")
+    pdf = tmp_path / "deck.pdf"
+    pdf.write_bytes(b"deck")
+
+    pdf_utils.extract_full_text_cached(str(pdf))
+
+    assert not (tmp_path / "cache").exists()